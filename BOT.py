@@ -1,11 +1,20 @@
 import discord
-from discord.ext import commands
+from discord.ext import commands, tasks
 from discord.ui import TextInput, Modal, Select
-import requests
-import json
+import aiohttp
+import asyncio
+import orjson
 import os
+import signal
 import random
 import io
+import time
+import heapq
+import itertools
+from operator import itemgetter
+from bisect import bisect_right
+from datetime import date, timedelta
+from collections import deque
 
 # --- Configuration ---
 # Token from environment variable (set in Railway Variables or .env file)
@@ -14,7 +23,25 @@ ADMIN_ID = 571430702630043668
 DATA_FILE = "user_data.json"
 
 API_URL = "https://danbooru.donmai.us/posts.json"
+POST_URL = "https://danbooru.donmai.us/posts/{}"  # Post page, .format(post_id)
 AUTOCOMPLETE_URL = "https://danbooru.donmai.us/autocomplete.json"
+TAGS_URL = "https://danbooru.donmai.us/tags.json"
+MAX_VIDEO_SIZE = 8_000_000  # Discord upload limit (8MB)
+IMAGE_EXTS = frozenset({"jpg", "jpeg", "png", "gif", "webp"})  # Embeddable in Discord
+VIDEO_EXTS = frozenset({"mp4", "webm"})
+# Post fields the bot actually reads (Danbooru returns dozens otherwise)
+POST_FIELDS = "id,file_url,large_file_url,file_ext,rating,score,fav_count,tag_string,tag_string_artist,tag_string_character"
+ARTIST_CACHE_TTL = 24 * 60 * 60  # Re-check artist popularity once a day
+ARTIST_CACHE_SIZE = 4096
+ARTIST_RETRY_DELAY = 5 * 60  # After a failed artist lookup
+AUTOCOMPLETE_CACHE_TTL = 60 * 60
+AUTOCOMPLETE_CACHE_SIZE = 10_000
+IMAGE_CACHE_TTL = 30  # Random pages go stale quickly
+IMAGE_CACHE_SIZE = 1024
+USERNAME_CACHE_TTL = 60 * 60  # Names of users the bot can't see, for ?leaderboard
+USERNAME_CACHE_SIZE = 1024
+IMAGE_PREFETCH_MIN = 5  # Fetch the next page in the background below this many cached posts
+VIDEO_CACHE_SIZE = 8  # Recent video files kept in memory for "Précédent"
 HEADERS = {
     "User-Agent": "DiscordDanbooruBot/4.0",
     "Accept": "application/json"
@@ -23,27 +50,87 @@ HEADERS = {
 intents = discord.Intents.default()
 intents.message_content = True
 
-bot = commands.Bot(command_prefix="?", intents=intents)
+class MujiBot(commands.Bot):
+    async def setup_hook(self):
+        # Runs once on the bot's own loop, before the gateway connects
+        global aiohttp_session, flush_lock, danbooru_sem, artist_sem
+        flush_lock = asyncio.Lock()
+        danbooru_sem = asyncio.Semaphore(8)
+        artist_sem = asyncio.Semaphore(4)
+        aiohttp_session = aiohttp.ClientSession(
+            headers=HEADERS,
+            connector=aiohttp.TCPConnector(limit=50, limit_per_host=10, ttl_dns_cache=300, keepalive_timeout=60)
+        )
+        flush_loop.start()
+
+    async def close(self):
+        await super().close()
+        # Close the shared HTTP session (and its keep-alive connections) with the bot
+        if aiohttp_session is not None and not aiohttp_session.closed:
+            await aiohttp_session.close()
+
+bot = MujiBot(command_prefix="?", intents=intents)
+
+# Fields every user record starts with
+DEFAULT_USER = {
+    "favorites": [],
+    "view_count": 0,
+    "waifame": 0,
+    "daily_favs": 0,
+    "last_fav_date": "",
+    "daily_streak": 0,
+    "last_daily": "",
+    "fish_caught": 0,
+    "last_fish": 0,
+    "last_steal": 0
+}
 
 # --- Bot State ---
-history = {} 
+HISTORY_LEN = 50  # Posts kept per guild for "Précédent"
+history = {}  # guild_id -> deque of recent posts
 video_history = {}  # Separate history for videos
 user_data = {}  # Local cache, synced with database
+dirty_users = set()  # User IDs changed since the last save
+# Loop-bound objects, created in MujiBot.setup_hook
+flush_lock = None  # Keeps background flushes in order
+danbooru_sem = None  # Concurrent Danbooru API calls (posts, autocomplete), 8 at a time
+artist_sem = None  # Artist lookups are secondary, 4 at a time so they can't starve the above
+aiohttp_session = None  # Shared HTTP session
+artist_cache = {}  # artist name -> (fetched_at, post_count, etag)
+autocomplete_cache = {}  # normalized query -> (fetched_at, suggestions, etag)
+image_cache = {}  # normalized tags -> (fetched_at, unused posts from the last random page, None)
+username_cache = {}  # user_id -> (fetched_at, name, None)
+image_fetches = {}  # normalized tags -> task loading a page into image_cache (one in flight per tags)
+video_cache = {}  # post_id -> downloaded video bytes, least recently used first
+today_cache = (None, "")  # (date, "YYYY-MM-DD") for get_today_date
+background_tasks = set()  # Fire-and-forget tasks, referenced until they finish
+favorite_ids = {}  # user_id -> set of favorited post IDs (derived from user_data, not saved)
 
 # --- Database Setup ---
 DATABASE_URL = os.getenv("DATABASE_URL")
+db_pool = None  # PostgreSQL connection pool, created on first use
 
 def get_db_connection():
-    """Get a connection to PostgreSQL database"""
+    """Get a connection from the PostgreSQL pool"""
+    global db_pool
     if not DATABASE_URL:
         return None
     try:
-        import psycopg2
-        return psycopg2.connect(DATABASE_URL)
+        if db_pool is None:
+            from psycopg2 import pool
+            db_pool = pool.ThreadedConnectionPool(minconn=2, maxconn=20, dsn=DATABASE_URL)
+        return db_pool.getconn()
     except Exception as e:
         print(f"Database connection error: {e}")
         return None
 
+def release_db(conn):
+    """Return a connection to the pool (rolls back any unfinished transaction)"""
+    try:
+        db_pool.putconn(conn)
+    except Exception as e:
+        print(f"Database release error: {e}")
+
 def init_db():
     """Initialize database tables"""
     conn = get_db_connection()
@@ -61,71 +148,145 @@ def init_db():
                 waifame INTEGER DEFAULT 0,
                 daily_favs INTEGER DEFAULT 0,
                 last_fav_date TEXT DEFAULT '',
-                favorites TEXT DEFAULT '[]'
+                favorites JSONB DEFAULT '[]'::jsonb
             )
         """)
+        # Migrate old tables that stored favorites as TEXT
+        cur.execute("""
+            SELECT data_type FROM information_schema.columns
+            WHERE table_name = 'users' AND column_name = 'favorites'
+        """)
+        row = cur.fetchone()
+        if row and row[0] == "text":
+            cur.execute("ALTER TABLE users ALTER COLUMN favorites DROP DEFAULT")
+            cur.execute("ALTER TABLE users ALTER COLUMN favorites TYPE jsonb USING favorites::jsonb")
+            cur.execute("ALTER TABLE users ALTER COLUMN favorites SET DEFAULT '[]'::jsonb")
+            print("Migrated favorites column to JSONB")
         conn.commit()
         print("Database initialized successfully!")
     except Exception as e:
         print(f"Database init error: {e}")
     finally:
-        conn.close()
+        release_db(conn)
 
 # --- Data Management (with PostgreSQL support) ---
 def load_user_data_json():
     """Fallback: Load from JSON file"""
     global user_data
+    favorite_ids.clear()  # Rebuilt lazily from the fresh data
     if os.path.exists(DATA_FILE):
         try:
-            with open(DATA_FILE, 'r') as f:
-                user_data = json.load(f)
+            with open(DATA_FILE, 'rb') as f:
+                user_data = orjson.loads(f.read())
+            for data in user_data.values():
+                fill_user_defaults(data)
         except Exception as e:
             print(f"Error loading user data: {e}")
             user_data = {}
 
-def save_user_data():
-    """Save user data to database or JSON fallback"""
-    global user_data
+def orjson_dumps_str(obj):
+    """orjson.dumps returning str, for psycopg2's Json adapter"""
+    return orjson.dumps(obj).decode()
+
+def mark_dirty(user_id):
+    """Flag a user as modified so the next save persists it"""
+    dirty_users.add(str(user_id))
+
+def snapshot_dirty_users():
+    """Grab and clear the dirty set, returns (uids, payload) safe to write from another thread"""
+    uids = list(dirty_users)
+    dirty_users.clear()
     
-    conn = get_db_connection()
-    if not conn:
-        # Fallback to JSON
+    if not DATABASE_URL:
+        # JSON fallback: the file always holds every user (compact, it's rewritten every flush)
+        return uids, orjson.dumps(user_data)
+    
+    from psycopg2.extras import Json
+    rows = []
+    for uid in uids:
+        data = user_data.get(uid)
+        if data is None:
+            continue
+        rows.append((
+            uid,
+            data["view_count"],
+            data["waifame"],
+            data["daily_favs"],
+            data["last_fav_date"],
+            Json(list(data["favorites"]), dumps=orjson_dumps_str)  # Copy: encoded later in the writer thread
+        ))
+    return uids, rows
+
+def write_user_data(payload):
+    """Write a snapshot to database or JSON fallback (blocking), returns True on success"""
+    if isinstance(payload, bytes):
         try:
-            with open(DATA_FILE, 'w') as f:
-                json.dump(user_data, f, indent=2)
+            # Write to a temp file and swap it in, so a crash mid-write can't truncate the data
+            tmp_file = f"{DATA_FILE}.tmp"
+            with open(tmp_file, 'wb') as f:
+                f.write(payload)
+            os.replace(tmp_file, DATA_FILE)
+            return True
         except Exception as e:
             print(f"Error saving user data: {e}")
-        return
+            return False
+    
+    if not payload:
+        return True
+    
+    conn = get_db_connection()
+    if not conn:
+        return False
     
     try:
+        from psycopg2.extras import execute_values
         cur = conn.cursor()
-        for uid, data in user_data.items():
-            cur.execute("""
-                INSERT INTO users (user_id, view_count, waifame, daily_favs, last_fav_date, favorites)
-                VALUES (%s, %s, %s, %s, %s, %s)
-                ON CONFLICT (user_id) DO UPDATE SET
-                    view_count = EXCLUDED.view_count,
-                    waifame = EXCLUDED.waifame,
-                    daily_favs = EXCLUDED.daily_favs,
-                    last_fav_date = EXCLUDED.last_fav_date,
-                    favorites = EXCLUDED.favorites
-            """, (
-                uid,
-                data.get("view_count", 0),
-                data.get("waifame", 0),
-                data.get("daily_favs", 0),
-                data.get("last_fav_date", ""),
-                json.dumps(data.get("favorites", []))
-            ))
+        # Single round trip for every dirty user
+        execute_values(cur, """
+            INSERT INTO users (user_id, view_count, waifame, daily_favs, last_fav_date, favorites)
+            VALUES %s
+            ON CONFLICT (user_id) DO UPDATE SET
+                view_count = EXCLUDED.view_count,
+                waifame = EXCLUDED.waifame,
+                daily_favs = EXCLUDED.daily_favs,
+                last_fav_date = EXCLUDED.last_fav_date,
+                favorites = EXCLUDED.favorites
+        """, payload)
         conn.commit()
+        return True
     except Exception as e:
         print(f"Database save error: {e}")
+        return False
     finally:
-        conn.close()
+        release_db(conn)
+
+def save_user_data():
+    """Write pending changes right away (used at shutdown, commands use mark_dirty)"""
+    if not dirty_users:
+        return
+    
+    uids, payload = snapshot_dirty_users()
+    if not write_user_data(payload):
+        dirty_users.update(uids)
+
+async def flush_dirty_users():
+    """Write pending user changes from a worker thread, one flush at a time"""
+    async with flush_lock:
+        if not dirty_users:
+            return
+        uids, payload = snapshot_dirty_users()
+        if not await asyncio.to_thread(write_user_data, payload):
+            dirty_users.update(uids)  # Retry on next flush
+
+@tasks.loop(seconds=5)
+async def flush_loop():
+    """Periodically write pending user changes without blocking the event loop"""
+    await flush_dirty_users()
 
 def load_user_data():
     """Load all user data from database"""
     global user_data
+    favorite_ids.clear()  # Rebuilt lazily from the fresh data
     
     conn = get_db_connection()
     if not conn:
@@ -138,69 +299,103 @@ def load_user_data():
         rows = cur.fetchall()
         
         for row in rows:
-            user_data[row[0]] = {
+            user_data[row[0]] = fill_user_defaults({
                 "view_count": row[1],
                 "waifame": row[2],
                 "daily_favs": row[3],
                 "last_fav_date": row[4] or "",
-                "favorites": json.loads(row[5]) if row[5] else []
-            }
+                "favorites": row[5] or []  # JSONB is decoded by psycopg2
+            })
         print(f"Loaded {len(rows)} users from database")
     except Exception as e:
         print(f"Database load error: {e}")
         load_user_data_json()
     finally:
-        conn.close()
+        release_db(conn)
+
+def fill_user_defaults(data):
+    """Ensure every field exists for old users (once at load, so commands can index directly)"""
+    for key, value in DEFAULT_USER.items():
+        if key not in data:
+            data[key] = [] if key == "favorites" else value
+    return data
+
+def new_user_data():
+    """Fresh user record (own favorites list, never shared)"""
+    return {**DEFAULT_USER, "favorites": []}
 
 def get_user_data(user_id):
     """Get or create user data"""
     uid = str(user_id)
-    if uid not in user_data:
-        user_data[uid] = {
-            "favorites": [], 
-            "view_count": 0,
-            "waifame": 0,
-            "daily_favs": 0,
-            "last_fav_date": ""
-        }
-    # Ensure new fields exist for old users
-    data = user_data[uid]
-    if "waifame" not in data: data["waifame"] = 0
-    if "daily_favs" not in data: data["daily_favs"] = 0
-    if "last_fav_date" not in data: data["last_fav_date"] = ""
+    data = user_data.get(uid)
+    if data is None:
+        data = user_data[uid] = new_user_data()
+        dirty_users.add(uid)
     return data
 
-def get_today_date():
-    """Get today's date as string"""
-    from datetime import datetime
-    return datetime.now().strftime("%Y-%m-%d")
+def get_favorite_ids(user_id):
+    """Set of post IDs the user has favorited (built once, then kept in sync with the list)"""
+    uid = str(user_id)
+    ids = favorite_ids.get(uid)
+    if ids is None:
+        ids = favorite_ids[uid] = {p.get('id') for p in get_user_data(uid)["favorites"]}
+    return ids
+
+def is_favorite(user_id, post_id):
+    """Check if a post is in the user's favorites"""
+    return post_id in get_favorite_ids(user_id)
+
+def add_favorite(user_id, fav_post):
+    """Append a post to the user's favorites"""
+    get_user_data(user_id)["favorites"].append(fav_post)
+    get_favorite_ids(user_id).add(fav_post.get('id'))
+    mark_dirty(user_id)
+
+def remove_favorite(user_id, post_id):
+    """Remove a post from the user's favorites"""
+    ids = get_favorite_ids(user_id)
+    if post_id not in ids:
+        return
+    ids.discard(post_id)
+    favs = get_user_data(user_id)["favorites"]
+    for i, p in enumerate(favs):
+        if p.get('id') == post_id:
+            del favs[i]
+            break
+    mark_dirty(user_id)
+
+def push_history(store, guild_id, post):
+    """Append a post to a guild's history, keeping only the last HISTORY_LEN"""
+    entries = store.get(guild_id)
+    if entries is None:
+        entries = store[guild_id] = deque(maxlen=HISTORY_LEN)
+    entries.append(post)
 
-def can_add_favorite(user_id):
-    """Check if user can add a favorite today (limit: 5 per day)"""
-    data = get_user_data(user_id)
-    today = get_today_date()
-    
-    # Reset if new day
-    if data.get("last_fav_date") != today:
-        data["daily_favs"] = 0
-        data["last_fav_date"] = today
-    
-    return data["daily_favs"] < 5
+def get_today_date():
+    """Get today's date as string (formatted once per day)"""
+    global today_cache
+    today = date.today()
+    if today_cache[0] != today:
+        today_cache = (today, today.isoformat())
+    return today_cache[1]
 
 def use_daily_favorite(user_id):
-    """Use one of the daily favorites slots"""
+    """Take one of today's favorite slots (limit: 5 per day), returns the slots left or None if none were left"""
     data = get_user_data(user_id)
     today = get_today_date()
     
-    if data.get("last_fav_date") != today:
+    # Reset if new day
+    if data["last_fav_date"] != today:
         data["daily_favs"] = 0
         data["last_fav_date"] = today
     
+    if data["daily_favs"] >= 5:
+        return None
     data["daily_favs"] += 1
-    save_user_data()
-    return 5 - data["daily_favs"]  # Return remaining
+    mark_dirty(user_id)
+    return 5 - data["daily_favs"]
 
-def calculate_waifame(post):
+async def calculate_waifame(post):
     """Calculate waifame earned from viewing an image based on its popularity"""
     score = post.get("score", 0)
     fav_count = post.get("fav_count", 0)
@@ -212,134 +407,270 @@ def calculate_waifame(post):
     fav_bonus = fav_count // 100  # +1 per 100 favorites
     
     # Artist fame bonus
-    artist_bonus = get_artist_fame_bonus(post)
+    artist_bonus = await get_artist_fame_bonus(post)
     
     return base + score_bonus + fav_bonus + artist_bonus
 
-def get_artist_fame_bonus(post):
-    """Get bonus waifame based on how famous the artist is on Danbooru"""
-    artist_tag = post.get("tag_string_artist", "").split()
-    
-    if not artist_tag:
-        return 0
-    
-    # Get the first (main) artist
-    artist_name = artist_tag[0]
-    
+def cache_store(cache, key, value, max_size, etag=None, fetched_at=None):
+    """Store (timestamp, value, etag) in a TTL cache dict, evicting the oldest entry when full"""
+    # Re-insert so the dict stays ordered oldest first
+    cache.pop(key, None)
+    cache[key] = (time.time() if fetched_at is None else fetched_at, value, etag)
+    if len(cache) > max_size:
+        del cache[next(iter(cache))]
+
+def revalidation_headers(cached):
+    """If-None-Match header for an expired cache entry, so Danbooru can answer 304"""
+    if cached and cached[2]:
+        return {"If-None-Match": cached[2]}
+    return None
+
+async def get_artist_post_count(artist_name):
+    """Get an artist's Danbooru post count, cached for ARTIST_CACHE_TTL"""
     # Check cache first (to avoid too many API calls)
-    if not hasattr(get_artist_fame_bonus, 'cache'):
-        get_artist_fame_bonus.cache = {}
+    cached = artist_cache.get(artist_name)
+    if cached and time.time() - cached[0] < ARTIST_CACHE_TTL:
+        return cached[1]
     
-    if artist_name in get_artist_fame_bonus.cache:
-        post_count = get_artist_fame_bonus.cache[artist_name]
-    else:
-        # Query Danbooru for artist post count
-        try:
-            artist_url = f"https://danbooru.donmai.us/tags.json?search[name]={artist_name}"
-            resp = requests.get(artist_url, headers=HEADERS, timeout=5)
-            if resp.status_code == 200:
-                data = resp.json()
+    # Query Danbooru for artist post count (revalidating the expired entry if we have one)
+    etag = None
+    post_count = None  # Stays None if the lookup fails
+    try:
+        params = {"search[name]": artist_name}
+        headers = revalidation_headers(cached)
+        async with artist_sem, aiohttp_session.get(TAGS_URL, params=params, headers=headers, timeout=aiohttp.ClientTimeout(total=5)) as resp:
+            if resp.status == 304:
+                post_count, etag = cached[1], cached[2]
+            elif resp.status == 200:
+                data = orjson.loads(await resp.read())
+                etag = resp.headers.get("ETag")
                 if data and len(data) > 0:
                     post_count = data[0].get("post_count", 0)
                 else:
                     post_count = 0
             else:
-                post_count = 0
-        except Exception as e:
-            print(f"Artist lookup error: {e}")
+                print(f"Artist lookup error: HTTP {resp.status}")
+    except Exception as e:
+        print(f"Artist lookup error: {e}")
+    
+    if post_count is None:
+        # Failed (timeout, 429...): keep the last known count and retry after ARTIST_RETRY_DELAY
+        # instead of caching 0 for a whole day
+        if cached:
+            post_count, etag = cached[1], cached[2]
+        else:
             post_count = 0
-        
-        # Cache the result
-        get_artist_fame_bonus.cache[artist_name] = post_count
+        fetched_at = time.time() - ARTIST_CACHE_TTL + ARTIST_RETRY_DELAY
+        cache_store(artist_cache, artist_name, post_count, ARTIST_CACHE_SIZE, etag, fetched_at)
+        return post_count
+    
+    # Cache the result
+    cache_store(artist_cache, artist_name, post_count, ARTIST_CACHE_SIZE, etag)
+    return post_count
+
+# Artist post count thresholds -> Waifame bonus
+# (<100: unknown, 100+: some recognition, 500+: known, 1k+: well-known, 2k+: famous, 5k+: very famous, 10k+: legendary)
+ARTIST_BONUS_THRESHOLDS = (100, 500, 1000, 2000, 5000, 10000)
+ARTIST_BONUSES = (0, 1, 2, 3, 5, 7, 10)
+
+async def get_artist_fame_bonus(post):
+    """Get bonus waifame based on how famous the artist is on Danbooru"""
+    artist_tag = post.get("tag_string_artist", "").split()
+    
+    if not artist_tag:
+        return 0
+    
+    # Get the first (main) artist
+    post_count = await get_artist_post_count(artist_tag[0])
     
-    # Calculate bonus based on post count
     # More posts = more famous artist = higher bonus
-    if post_count >= 10000:
-        return 10  # Legendary artist (10k+ posts)
-    elif post_count >= 5000:
-        return 7   # Very famous (5k-10k)
-    elif post_count >= 2000:
-        return 5   # Famous (2k-5k)
-    elif post_count >= 1000:
-        return 3   # Well-known (1k-2k)
-    elif post_count >= 500:
-        return 2   # Known (500-1k)
-    elif post_count >= 100:
-        return 1   # Some recognition (100-500)
-    else:
-        return 0   # New/unknown artist
+    return ARTIST_BONUSES[bisect_right(ARTIST_BONUS_THRESHOLDS, post_count)]
 
-def add_waifame(user_id, post):
+async def add_waifame(user_id, post):
     """Add waifame to user based on image viewed"""
     data = get_user_data(user_id)
-    earned = calculate_waifame(post)
-    data["waifame"] = data.get("waifame", 0) + earned
-    save_user_data()
+    earned = await calculate_waifame(post)
+    data["waifame"] += earned
+    mark_dirty(user_id)
     return earned, data["waifame"]
 
 def increment_view_count(user_id, post=None):
     """Increment view count for a user (Waifame only on favorites now)"""
     data = get_user_data(user_id)
-    data["view_count"] = data.get("view_count", 0) + 1
-    save_user_data()
+    data["view_count"] += 1
+    mark_dirty(user_id)
     return data["view_count"]
 
-def get_danbooru_image(tags="rating:safe"):
-    """Fetch a random image from Danbooru, ensuring it has a valid embeddable URL"""
+async def fetch_image_page(tags):
+    """One random page of posts with an embeddable image URL (empty list on error)"""
+    posts = []
     try:
-        params = {"tags": tags, "random": "true", "limit": 10}
-        resp = requests.get(API_URL, headers=HEADERS, params=params, timeout=10)
-        if resp.status_code == 200:
-            data = resp.json()
-            if data:
-                for post in data:
-                    file_url = post.get('file_url') or post.get('large_file_url')
-                    if file_url:
-                        if file_url.lower().endswith(('.jpg', '.jpeg', '.png', '.gif', '.webp')):
-                            post['file_url'] = file_url
-                            return post
-                return None
+        params = {"tags": tags, "random": "true", "limit": 20, "only": POST_FIELDS}
+        async with danbooru_sem, aiohttp_session.get(API_URL, params=params, timeout=aiohttp.ClientTimeout(total=10)) as resp:
+            if resp.status != 200:
+                return posts
+            data = orjson.loads(await resp.read())
+        for post in data or ():
+            file_url = post.get('file_url') or post.get('large_file_url')
+            if file_url and post.get('file_ext', '').lower() in IMAGE_EXTS:
+                post['file_url'] = file_url
+                posts.append(post)
     except Exception as e:
         print(f"API Error: {e}")
-    return None
+    return posts
 
-def get_tag_suggestions(query):
-    """Get tag suggestions from Danbooru autocomplete API"""
+async def get_danbooru_image(tags="rating:safe"):
+    """Fetch a random image from Danbooru, ensuring it has a valid embeddable URL"""
+    # Serve from the last random page for these tags while it's fresh
+    key = tags.strip().lower()
+    cached = image_cache.get(key)
+    if cached and cached[1] and time.time() - cached[0] < IMAGE_CACHE_TTL:
+        return cached[1].pop()
+    
+    # Wait on the page fetch already in flight for these tags, if any, instead of sending our own
+    task = image_fetches.get(key) or start_image_fetch(tags, key)
+    page = await asyncio.shield(task)
+    if not page:
+        return None
+    cached = image_cache.get(key)
+    if cached and cached[1]:
+        return cached[1].pop()
+    # A burst of callers already drained the page: share one of its posts rather than failing
+    return random.choice(page)
+
+def start_image_fetch(tags, key):
+    """Start loading a new page for these tags into image_cache, shared by every caller until it's done"""
+    task = image_fetches[key] = asyncio.create_task(load_image_page(tags, key))
+    return task
+
+async def load_image_page(tags, key):
+    """Fetch a page into image_cache, returns a snapshot of its posts (empty when nothing usable came back)"""
+    try:
+        posts = await fetch_image_page(tags)
+    finally:
+        # Unregister before waiters resume, so a second round starts a new fetch
+        image_fetches.pop(key, None)
+    page = tuple(posts)  # The cached list gets popped by callers
+    if posts:
+        cache_store(image_cache, key, posts, IMAGE_CACHE_SIZE)
+    return page
+
+def prefetch_images(tags):
+    """Refill the cached page for these tags in the background when it's running low,
+    so the next ?next / Suivant doesn't wait on Danbooru"""
+    key = tags.strip().lower()
+    if key in image_fetches:
+        return
+    cached = image_cache.get(key)
+    if cached and len(cached[1]) >= IMAGE_PREFETCH_MIN and time.time() - cached[0] < IMAGE_CACHE_TTL:
+        return
+    start_image_fetch(tags, key)
+
+async def get_tag_suggestions(query):
+    """Get tag suggestions from Danbooru autocomplete API (cached for AUTOCOMPLETE_CACHE_TTL)"""
+    query = query.strip().lower()
+    cached = autocomplete_cache.get(query)
+    if cached and time.time() - cached[0] < AUTOCOMPLETE_CACHE_TTL:
+        return cached[1]
+    
     try:
         params = {"search[query]": query, "search[type]": "tag_query", "limit": 10}
-        resp = requests.get(AUTOCOMPLETE_URL, headers=HEADERS, params=params, timeout=5)
-        if resp.status_code == 200:
-            data = resp.json()
-            return [item.get("value", item.get("label", "")) for item in data[:10]]
+        headers = revalidation_headers(cached)
+        async with danbooru_sem, aiohttp_session.get(AUTOCOMPLETE_URL, params=params, headers=headers, timeout=aiohttp.ClientTimeout(total=5)) as resp:
+            if resp.status == 304:
+                # Unchanged: keep the cached suggestions, nothing to parse
+                cache_store(autocomplete_cache, query, cached[1], AUTOCOMPLETE_CACHE_SIZE, cached[2])
+                return cached[1]
+            if resp.status == 200:
+                data = orjson.loads(await resp.read())
+                suggestions = [item.get("value", item.get("label", "")) for item in data[:10]]
+                cache_store(autocomplete_cache, query, suggestions, AUTOCOMPLETE_CACHE_SIZE, resp.headers.get("ETag"))
+                return suggestions
     except Exception as e:
         print(f"Autocomplete Error: {e}")
     return []
 
-def get_danbooru_video(tags="rating:safe"):
-    """Fetch a random video from Danbooru (.mp4 or .webm only)"""
+async def get_danbooru_video(tags="rating:safe", exclude_id=None):
+    """Fetch a random video from Danbooru (.mp4 or .webm only), avoiding exclude_id when possible"""
     try:
         # Add 'video' tag to ensure we get videos
         video_tags = f"{tags} video"
-        params = {"tags": video_tags, "random": "true", "limit": 20}
-        resp = requests.get(API_URL, headers=HEADERS, params=params, timeout=10)
-        if resp.status_code == 200:
-            data = resp.json()
-            if data:
-                for post in data:
-                    file_ext = post.get('file_ext', '')
-                    file_url = post.get('file_url') or post.get('large_file_url')
-                    if file_url and file_ext in ['mp4', 'webm']:
-                        post['file_url'] = file_url
-                        return post
+        params = {"tags": video_tags, "random": "true", "limit": 20, "only": POST_FIELDS}
+        async with danbooru_sem, aiohttp_session.get(API_URL, params=params, timeout=aiohttp.ClientTimeout(total=10)) as resp:
+            if resp.status != 200:
                 return None
+            data = orjson.loads(await resp.read())
+        if data:
+            fallback = None
+            for post in data:
+                file_ext = post.get('file_ext', '')
+                file_url = post.get('file_url') or post.get('large_file_url')
+                if file_url and file_ext in VIDEO_EXTS:
+                    post['file_url'] = file_url
+                    if post.get('id') != exclude_id:
+                        return post
+                    fallback = post
+            # Only the current video matched these tags
+            return fallback
     except Exception as e:
         print(f"Video API Error: {e}")
     return None
 
+async def download_video(file_url):
+    """Download a video in chunks, returns None as soon as it exceeds MAX_VIDEO_SIZE"""
+    async with aiohttp_session.get(file_url, timeout=aiohttp.ClientTimeout(total=30)) as resp:
+        if resp.status != 200:
+            return None
+        # Skip the body entirely when the server already tells us it's too big
+        if resp.content_length is not None and resp.content_length >= MAX_VIDEO_SIZE:
+            return None
+        # Collect chunks and join once: no bytearray regrowth and no final bytes() copy,
+        # and io.BytesIO() over the resulting bytes shares the buffer instead of copying it
+        chunks = []
+        size = 0
+        async for chunk in resp.content.iter_chunked(65536):
+            chunks.append(chunk)
+            size += len(chunk)
+            if size >= MAX_VIDEO_SIZE:
+                return None  # Too large, stop downloading
+        return b"".join(chunks)
+
+def spawn(coro):
+    """Run a coroutine in the background without awaiting it"""
+    task = asyncio.create_task(coro)
+    background_tasks.add(task)
+    task.add_done_callback(background_tasks.discard)
+    return task
+
+async def delete_quietly(message):
+    """Delete a message, ignoring it if it's already gone or we lack permissions"""
+    try:
+        await message.delete()
+    except discord.HTTPException:
+        pass
+
+async def fetch_video(post_id, file_url):
+    """download_video with a small LRU cache, so rewinding doesn't download again"""
+    content = video_cache.pop(post_id, None)
+    if content is None:
+        content = await download_video(file_url)
+        if content is None:
+            return None
+    video_cache[post_id] = content
+    if len(video_cache) > VIDEO_CACHE_SIZE:
+        del video_cache[next(iter(video_cache))]
+    return content
+
+@bot.event
+async def on_disconnect():
+    # Don't sit on unsaved changes while the gateway reconnects
+    await flush_dirty_users()
+
 @bot.event
 async def on_ready():
+    # Fires again on every reconnect: session, locks and flush_loop are set up once in setup_hook,
+    # and user_data is loaded once before bot.run()
     print(f'Connecté en tant que {bot.user}')
-    load_user_data()
 
 # --- HELPER FUNCTION TO SEND MAIN VIEW ---
 async def send_main_view(ctx, post, tags, user_id):
@@ -347,17 +678,15 @@ async def send_main_view(ctx, post, tags, user_id):
     
     file_url = post.get('file_url')
     post_id = post.get('id')
-    post_url = f"https://danbooru.donmai.us/posts/{post_id}"
+    post_url = POST_URL.format(post_id)
     
-    if ctx.guild.id not in history:
-        history[ctx.guild.id] = []
-    history[ctx.guild.id].append(post)
+    push_history(history, ctx.guild.id, post)
     
     # Increment view count (Waifame is earned on favorites only now)
     view_count = increment_view_count(user_id, post)
     
     # Calculate potential waifame value
-    potential_waifame = calculate_waifame(post)
+    potential_waifame = await calculate_waifame(post)
     
     # Create View
     view = ImageView(ctx.guild.id, post, tags, user_id)
@@ -367,6 +696,7 @@ async def send_main_view(ctx, post, tags, user_id):
     embed.set_footer(text=f"👁️ {view_count} vues | ❤️ = +{potential_waifame} Waifame")
     
     await ctx.send(embed=embed, view=view)
+    prefetch_images(tags)
 
 @bot.command()
 async def next(ctx, *, tags: str = "rating:safe"):
@@ -375,7 +705,7 @@ async def next(ctx, *, tags: str = "rating:safe"):
     # Log user info to terminal
     print(f"[?next] Utilisateur: {ctx.author.name} (ID: {ctx.author.id}) | Tags: {tags}")
 
-    post = get_danbooru_image(tags)
+    post = await get_danbooru_image(tags)
     
     if post:
         await send_main_view(ctx, post, tags, ctx.author.id)
@@ -391,29 +721,27 @@ async def vnext(ctx, *, tags: str = "rating:safe"):
 
     await ctx.send("🔄 Chargement de la vidéo...", delete_after=3)
     
-    post = get_danbooru_video(tags)
+    post = await get_danbooru_video(tags)
     
     if post:
         file_url = post.get('file_url')
         post_id = post.get('id')
-        post_url = f"https://danbooru.donmai.us/posts/{post_id}"
+        post_url = POST_URL.format(post_id)
         file_ext = post.get('file_ext', 'mp4')
         
         # Add to video history
-        if ctx.guild.id not in video_history:
-            video_history[ctx.guild.id] = []
-        video_history[ctx.guild.id].append(post)
+        push_history(video_history, ctx.guild.id, post)
         
         # Track view (Waifame earned on favorites only)
         view_count = increment_view_count(ctx.author.id, post)
-        potential_waifame = calculate_waifame(post)
+        potential_waifame = await calculate_waifame(post)
         
         # Try to download and upload video as attachment
         video_msg = None
         try:
-            resp = requests.get(file_url, headers=HEADERS, timeout=30)
-            if resp.status_code == 200 and len(resp.content) < 8_000_000:  # 8MB limit
-                video_file = discord.File(io.BytesIO(resp.content), filename=f"video_{post_id}.{file_ext}")
+            content = await fetch_video(post_id, file_url)
+            if content is not None:  # 8MB limit
+                video_file = discord.File(io.BytesIO(content), filename=f"video_{post_id}.{file_ext}")
                 video_msg = await ctx.send(file=video_file)
             else:
                 # Too large, send as link
@@ -437,7 +765,7 @@ async def vnext(ctx, *, tags: str = "rating:safe"):
 @bot.command()
 async def favorites_list(ctx):
     """Affiche tes images favorites (privé - visible uniquement par toi)"""
-    user_favs = get_user_data(ctx.author.id).get("favorites", [])
+    user_favs = get_user_data(ctx.author.id)["favorites"]
     
     if len(user_favs) == 0:
         await ctx.send("Tu n'as pas encore de favoris. Ajoutes-en en cliquant sur le bouton ❤️ !", ephemeral=True, delete_after=10)
@@ -449,7 +777,7 @@ async def favorites_list(ctx):
     file_url = first_post.get('file_url')
     post_id = first_post.get('id')
     
-    embed = discord.Embed(title=f"❤️ Favori #{post_id}", url=f"https://danbooru.donmai.us/posts/{post_id}", color=0xFF0055)
+    embed = discord.Embed(title=f"❤️ Favori #{post_id}", url=POST_URL.format(post_id), color=0xFF0055)
     embed.set_image(url=file_url)
     embed.set_footer(text=f"1/{len(user_favs)} | Visible uniquement par toi")
     
@@ -461,16 +789,16 @@ async def favorites_list(ctx):
 async def stats(ctx):
     """Affiche tes statistiques"""
     data = get_user_data(ctx.author.id)
-    view_count = data.get("view_count", 0)
-    fav_count = len(data.get("favorites", []))
-    waifame = data.get("waifame", 0)
+    view_count = data["view_count"]
+    fav_count = len(data["favorites"])
+    waifame = data["waifame"]
     
     # Check daily favorites
     today = get_today_date()
-    if data.get("last_fav_date") != today:
+    if data["last_fav_date"] != today:
         daily_remaining = 5
     else:
-        daily_remaining = 5 - data.get("daily_favs", 0)
+        daily_remaining = 5 - data["daily_favs"]
     
     embed = discord.Embed(title="📊 Tes Statistiques", color=0x00FF88)
     embed.add_field(name="👁️ Images Vues", value=str(view_count), inline=True)
@@ -487,13 +815,10 @@ async def leaderboard(ctx):
     # Get all users and their waifame
     leaderboard_data = []
     for uid, data in user_data.items():
-        waifame = data.get("waifame", 0)
+        waifame = data["waifame"]
         if waifame > 0:  # Only include users with waifame
             leaderboard_data.append((uid, waifame))
     
-    # Sort by waifame (descending)
-    leaderboard_data.sort(key=lambda x: x[1], reverse=True)
-    
     if not leaderboard_data:
         await ctx.send("Personne n'a encore de Waifame ! Utilise `?next` pour commencer à en gagner.")
         return
@@ -504,13 +829,28 @@ async def leaderboard(ctx):
     medals = ["🥇", "🥈", "🥉"]
     leaderboard_text = ""
     
-    for i, (uid, waifame) in enumerate(leaderboard_data[:10]):  # Top 10
-        # Try to get username
-        try:
-            user = await bot.fetch_user(int(uid))
-            username = user.name
-        except:
-            username = f"Utilisateur #{uid[:8]}"
+    # Top 10 by waifame (no need to sort everyone)
+    top_users = heapq.nlargest(10, leaderboard_data, key=itemgetter(1))
+    
+    # Resolve usernames: bot cache, then recently fetched names, then fetch the rest at once
+    now = time.time()
+    names = {}
+    for uid, _ in top_users:
+        user = bot.get_user(int(uid))
+        cached = username_cache.get(uid)
+        if user:
+            names[uid] = user.name
+        elif cached and now - cached[0] < USERNAME_CACHE_TTL:
+            names[uid] = cached[1]
+    missing = [uid for uid, _ in top_users if uid not in names]
+    fetched = await asyncio.gather(*(bot.fetch_user(int(uid)) for uid in missing), return_exceptions=True)
+    for uid, user in zip(missing, fetched):
+        if not isinstance(user, Exception):
+            names[uid] = user.name
+            cache_store(username_cache, uid, user.name, USERNAME_CACHE_SIZE)
+    
+    for i, (uid, waifame) in enumerate(top_users):
+        username = names.get(uid) or f"Utilisateur #{uid[:8]}"
         
         # Add medal for top 3
         if i < 3:
@@ -527,6 +867,70 @@ async def leaderboard(ctx):
 
 # ============== MINI-GAMES ==============
 
+# Slots symbols and their cumulative weights (30, 25, 20, 15, 10) - 7️⃣ is rarest
+SLOTS_SYMBOLS = ("🍒", "🍋", "🍊", "💎", "7️⃣")
+SLOTS_CUM_WEIGHTS = (30, 55, 75, 90, 100)
+
+# Fish rarities
+FISH_POOL = (
+    # (emoji, name, rarity, min_value, max_value, weight)
+    ("🐟", "Poisson", "Commun", 5, 15, 40),
+    ("🐠", "Poisson Tropical", "Commun", 8, 18, 35),
+    ("🐡", "Fugu", "Rare", 20, 40, 15),
+    ("🦐", "Crevette Royale", "Rare", 25, 45, 12),
+    ("🦑", "Calamar Géant", "Épique", 50, 80, 5),
+    ("🐙", "Poulpe", "Épique", 55, 85, 4),
+    ("🦈", "Requin", "Légendaire", 100, 150, 2),
+    ("🐋", "Baleine", "Légendaire", 150, 250, 1),
+    ("👟", "Vieille Chaussure", "Déchet", 1, 3, 10),
+)
+FISH_CUM_WEIGHTS = tuple(itertools.accumulate(f[5] for f in FISH_POOL))
+
+# Color based on rarity
+FISH_COLORS = {
+    "Commun": 0x808080,
+    "Rare": 0x0099FF,
+    "Épique": 0x9B59B6,
+    "Légendaire": 0xFFD700,
+    "Déchet": 0x8B4513
+}
+
+# Blackjack deck
+SUITS = ("♠️", "♥️", "♦️", "♣️")
+VALUES = ("A", "2", "3", "4", "5", "6", "7", "8", "9", "10", "J", "Q", "K")
+DECK = tuple((v, s) for s in SUITS for v in VALUES)
+CARD_VALUES = {**{str(i): i for i in range(2, 11)}, "J": 10, "Q": 10, "K": 10, "A": 11}  # Aces start at 11
+
+def draw_card(drawn):
+    """Draw a random card that hasn't been dealt yet in this game"""
+    i = random.randrange(len(DECK))
+    while i in drawn:
+        i = random.randrange(len(DECK))
+    drawn.add(i)
+    return DECK[i]
+
+def add_card_value(value, aces, card):
+    """Add one card to a running hand value, returns (value, aces still counted as 11)"""
+    rank = card[0]
+    value += CARD_VALUES[rank]
+    if rank == "A":
+        aces += 1
+    while value > 21 and aces:
+        value -= 10
+        aces -= 1
+    return value, aces
+
+def deal_card(game, who):
+    """Draw a card into game[who] ("player" or "dealer") and update that hand's value"""
+    card = draw_card(game["drawn"])
+    game[who].append(card)
+    game[f"{who}_val"], game[f"{who}_aces"] = add_card_value(game[f"{who}_val"], game[f"{who}_aces"], card)
+
+def format_hand(hand, hide_second=False):
+    if hide_second:
+        return f"{hand[0][0]}{hand[0][1]} | 🂠"
+    return " | ".join([f"{c[0]}{c[1]}" for c in hand])
+
 @bot.command()
 async def slots(ctx, mise: int = 0):
     """🎰 Machine à sous - Mise ton Waifame !"""
@@ -535,16 +939,12 @@ async def slots(ctx, mise: int = 0):
         return
     
     data = get_user_data(ctx.author.id)
-    if data.get("waifame", 0) < mise:
-        await ctx.send(f"❌ Tu n'as pas assez de Waifame ! Tu as **{data.get('waifame', 0)}** 💰")
+    if data["waifame"] < mise:
+        await ctx.send(f"❌ Tu n'as pas assez de Waifame ! Tu as **{data['waifame']}** 💰")
         return
     
-    # Symbols and their weights
-    symbols = ["🍒", "🍋", "🍊", "💎", "7️⃣"]
-    weights = [30, 25, 20, 15, 10]  # 7️⃣ is rarest
-    
     # Spin the slots
-    result = random.choices(symbols, weights=weights, k=3)
+    result = random.choices(SLOTS_SYMBOLS, cum_weights=SLOTS_CUM_WEIGHTS, k=3)
     
     # Calculate winnings
     if result[0] == result[1] == result[2]:
@@ -568,8 +968,8 @@ async def slots(ctx, mise: int = 0):
         winnings = 0
     
     # Update waifame
-    data["waifame"] = data.get("waifame", 0) - mise + winnings
-    save_user_data()
+    data["waifame"] += winnings - mise
+    mark_dirty(ctx.author.id)
     
     # Build embed
     embed = discord.Embed(title=title, color=0xFFD700 if winnings > 0 else 0xFF0000)
@@ -591,16 +991,15 @@ async def daily(ctx):
     data = get_user_data(ctx.author.id)
     today = get_today_date()
     
-    last_daily = data.get("last_daily", "")
-    streak = data.get("daily_streak", 0)
+    last_daily = data["last_daily"]
+    streak = data["daily_streak"]
     
     if last_daily == today:
         await ctx.send("❌ Tu as déjà récupéré ta récompense aujourd'hui ! Reviens demain 🌅")
         return
     
     # Check if streak continues (yesterday)
-    from datetime import datetime, timedelta
-    yesterday = (datetime.now() - timedelta(days=1)).strftime("%Y-%m-%d")
+    yesterday = (date.today() - timedelta(days=1)).isoformat()
     
     if last_daily == yesterday:
         streak += 1
@@ -613,10 +1012,10 @@ async def daily(ctx):
     total_reward = base_reward + streak_bonus
     
     # Update data
-    data["waifame"] = data.get("waifame", 0) + total_reward
+    data["waifame"] += total_reward
     data["last_daily"] = today
     data["daily_streak"] = streak
-    save_user_data()
+    mark_dirty(ctx.author.id)
     
     embed = discord.Embed(title="🎁 Récompense Quotidienne !", color=0x00FF88)
     embed.add_field(name="💰 Récompense", value=f"+{base_reward} Waifame", inline=True)
@@ -630,11 +1029,10 @@ async def daily(ctx):
 @bot.command()
 async def fish(ctx):
     """🎣 Pêche un poisson et gagne du Waifame !"""
-    import time
     data = get_user_data(ctx.author.id)
     
     # Check cooldown (30 minutes)
-    last_fish = data.get("last_fish", 0)
+    last_fish = data["last_fish"]
     cooldown = 30 * 60  # 30 minutes in seconds
     time_left = (last_fish + cooldown) - time.time()
     
@@ -644,42 +1042,18 @@ async def fish(ctx):
         await ctx.send(f"🎣 Tu dois attendre **{minutes}m {seconds}s** avant de pêcher à nouveau !")
         return
     
-    # Fish rarities
-    fish_pool = [
-        # (emoji, name, rarity, min_value, max_value, weight)
-        ("🐟", "Poisson", "Commun", 5, 15, 40),
-        ("🐠", "Poisson Tropical", "Commun", 8, 18, 35),
-        ("🐡", "Fugu", "Rare", 20, 40, 15),
-        ("🦐", "Crevette Royale", "Rare", 25, 45, 12),
-        ("🦑", "Calamar Géant", "Épique", 50, 80, 5),
-        ("🐙", "Poulpe", "Épique", 55, 85, 4),
-        ("🦈", "Requin", "Légendaire", 100, 150, 2),
-        ("🐋", "Baleine", "Légendaire", 150, 250, 1),
-        ("👟", "Vieille Chaussure", "Déchet", 1, 3, 10),
-    ]
-    
-    weights = [f[5] for f in fish_pool]
-    caught = random.choices(fish_pool, weights=weights, k=1)[0]
+    caught = random.choices(FISH_POOL, cum_weights=FISH_CUM_WEIGHTS, k=1)[0]
     
     emoji, name, rarity, min_val, max_val, _ = caught
     value = random.randint(min_val, max_val)
     
     # Update data
-    data["waifame"] = data.get("waifame", 0) + value
+    data["waifame"] += value
     data["last_fish"] = time.time()
-    data["fish_caught"] = data.get("fish_caught", 0) + 1
-    save_user_data()
-    
-    # Color based on rarity
-    colors = {
-        "Commun": 0x808080,
-        "Rare": 0x0099FF,
-        "Épique": 0x9B59B6,
-        "Légendaire": 0xFFD700,
-        "Déchet": 0x8B4513
-    }
+    data["fish_caught"] += 1
+    mark_dirty(ctx.author.id)
     
-    embed = discord.Embed(title="🎣 Partie de pêche !", color=colors.get(rarity, 0x808080))
+    embed = discord.Embed(title="🎣 Partie de pêche !", color=FISH_COLORS.get(rarity, 0x808080))
     embed.add_field(name="🐟 Prise", value=f"{emoji} **{name}**", inline=True)
     embed.add_field(name="⭐ Rareté", value=rarity, inline=True)
     embed.add_field(name="💰 Valeur", value=f"+{value} Waifame", inline=True)
@@ -692,8 +1066,6 @@ async def fish(ctx):
 @bot.command()
 async def steal(ctx, target: discord.Member = None):
     """💰 Essaie de voler du Waifame à quelqu'un !"""
-    import time
-    
     if target is None:
         await ctx.send("❌ Usage: `?steal @utilisateur`")
         return
@@ -710,7 +1082,7 @@ async def steal(ctx, target: discord.Member = None):
     victim_data = get_user_data(target.id)
     
     # Check cooldown (1 hour)
-    last_steal = thief_data.get("last_steal", 0)
+    last_steal = thief_data["last_steal"]
     cooldown = 60 * 60  # 1 hour
     time_left = (last_steal + cooldown) - time.time()
     
@@ -720,7 +1092,7 @@ async def steal(ctx, target: discord.Member = None):
         return
     
     # Check if victim has waifame
-    victim_waifame = victim_data.get("waifame", 0)
+    victim_waifame = victim_data["waifame"]
     if victim_waifame < 50:
         await ctx.send(f"❌ **{target.name}** est trop pauvre pour être volé (< 50 Waifame)")
         return
@@ -735,9 +1107,10 @@ async def steal(ctx, target: discord.Member = None):
         stolen = int(victim_waifame * steal_percent)
         stolen = max(stolen, 10)  # Minimum 10
         
-        thief_data["waifame"] = thief_data.get("waifame", 0) + stolen
-        victim_data["waifame"] = victim_data.get("waifame", 0) - stolen
-        save_user_data()
+        thief_data["waifame"] += stolen
+        victim_data["waifame"] -= stolen
+        mark_dirty(target.id)
+        mark_dirty(ctx.author.id)
         
         embed = discord.Embed(title="💰 Vol réussi !", color=0x00FF00)
         embed.add_field(name="🎭 Victime", value=target.name, inline=True)
@@ -745,11 +1118,11 @@ async def steal(ctx, target: discord.Member = None):
         embed.add_field(name="💳 Ton solde", value=f"{thief_data['waifame']} Waifame", inline=True)
     else:
         # Fail - lose 20% of own waifame as fine
-        fine = int(thief_data.get("waifame", 0) * 0.20)
+        fine = int(thief_data["waifame"] * 0.20)
         fine = max(fine, 10)
         
-        thief_data["waifame"] = max(0, thief_data.get("waifame", 0) - fine)
-        save_user_data()
+        thief_data["waifame"] = max(0, thief_data["waifame"] - fine)
+        mark_dirty(ctx.author.id)
         
         embed = discord.Embed(title="🚨 Vol échoué !", color=0xFF0000)
         embed.add_field(name="👮 Attrapé !", value=f"Tu as été pris en flagrant délit !", inline=False)
@@ -770,57 +1143,40 @@ async def blackjack(ctx, mise: int = 0):
         return
     
     data = get_user_data(ctx.author.id)
-    if data.get("waifame", 0) < mise:
-        await ctx.send(f"❌ Tu n'as pas assez de Waifame ! Tu as **{data.get('waifame', 0)}** 💰")
+    if data["waifame"] < mise:
+        await ctx.send(f"❌ Tu n'as pas assez de Waifame ! Tu as **{data['waifame']}** 💰")
         return
     
-    # Create deck and deal
-    suits = ["♠️", "♥️", "♦️", "♣️"]
-    values = ["A", "2", "3", "4", "5", "6", "7", "8", "9", "10", "J", "Q", "K"]
-    deck = [(v, s) for s in suits for v in values]
-    random.shuffle(deck)
-    
-    player_hand = [deck.pop(), deck.pop()]
-    dealer_hand = [deck.pop(), deck.pop()]
-    
-    def hand_value(hand):
-        value = 0
-        aces = 0
-        for card, _ in hand:
-            if card in ["J", "Q", "K"]:
-                value += 10
-            elif card == "A":
-                value += 11
-                aces += 1
-            else:
-                value += int(card)
-        while value > 21 and aces:
-            value -= 10
-            aces -= 1
-        return value
-    
-    def format_hand(hand, hide_second=False):
-        if hide_second:
-            return f"{hand[0][0]}{hand[0][1]} | 🂠"
-        return " | ".join([f"{c[0]}{c[1]}" for c in hand])
-    
-    # Store game state
+    # Store game state (hand values are kept up to date as cards are dealt)
     game_id = ctx.author.id
-    blackjack_games[game_id] = {
-        "deck": deck,
-        "player": player_hand,
-        "dealer": dealer_hand,
+    game = {
+        "drawn": set(),
+        "player": [],
+        "player_val": 0,
+        "player_aces": 0,
+        "dealer": [],
+        "dealer_val": 0,
+        "dealer_aces": 0,
         "mise": mise,
         "active": True
     }
+    blackjack_games[game_id] = game
     
-    player_val = hand_value(player_hand)
+    # Deal (cards are drawn lazily, no need to shuffle the whole deck)
+    deal_card(game, "player")
+    deal_card(game, "player")
+    deal_card(game, "dealer")
+    deal_card(game, "dealer")
+    
+    player_hand = game["player"]
+    dealer_hand = game["dealer"]
+    player_val = game["player_val"]
     
     # Check for natural blackjack
     if player_val == 21:
         winnings = int(mise * 2.5)
-        data["waifame"] = data.get("waifame", 0) + winnings - mise
-        save_user_data()
+        data["waifame"] += winnings - mise
+        mark_dirty(ctx.author.id)
         del blackjack_games[game_id]
         
         embed = discord.Embed(title="🃏 BLACKJACK !", color=0xFFD700)
@@ -844,6 +1200,12 @@ class BlackjackView(discord.ui.View):
         self.user_id = user_id
         self.mise = mise
     
+    def _disable_all(self):
+        """Grey out the buttons and stop listening once the game is over"""
+        for child in self.children:
+            child.disabled = True
+        self.stop()
+    
     @discord.ui.button(label="🃏 Hit", style=discord.ButtonStyle.primary)
     async def hit(self, interaction: discord.Interaction, button: discord.ui.Button):
         if interaction.user.id != self.user_id:
@@ -856,28 +1218,27 @@ class BlackjackView(discord.ui.View):
             return
         
         # Draw card
-        game["player"].append(game["deck"].pop())
-        player_val = self.hand_value(game["player"])
+        deal_card(game, "player")
+        player_val = game["player_val"]
         
         if player_val > 21:
             # Bust
             game["active"] = False
             data = get_user_data(self.user_id)
-            data["waifame"] = data.get("waifame", 0) - self.mise
-            save_user_data()
+            data["waifame"] -= self.mise
+            mark_dirty(self.user_id)
             
             embed = discord.Embed(title="💥 BUST ! Tu as perdu !", color=0xFF0000)
-            embed.add_field(name="Tes cartes", value=f"{self.format_hand(game['player'])} = **{player_val}**", inline=False)
+            embed.add_field(name="Tes cartes", value=f"{format_hand(game['player'])} = **{player_val}**", inline=False)
             embed.add_field(name="💸 Perte", value=f"-{self.mise} Waifame", inline=True)
             
-            for child in self.children:
-                child.disabled = True
+            self._disable_all()
             await interaction.response.edit_message(embed=embed, view=self)
             del blackjack_games[self.user_id]
         else:
             embed = discord.Embed(title="🃏 Blackjack", color=0x2ECC71)
-            embed.add_field(name="Tes cartes", value=f"{self.format_hand(game['player'])} = **{player_val}**", inline=False)
-            embed.add_field(name="Dealer", value=f"{self.format_hand(game['dealer'], hide_second=True)}", inline=False)
+            embed.add_field(name="Tes cartes", value=f"{format_hand(game['player'])} = **{player_val}**", inline=False)
+            embed.add_field(name="Dealer", value=f"{format_hand(game['dealer'], hide_second=True)}", inline=False)
             await interaction.response.edit_message(embed=embed, view=self)
     
     @discord.ui.button(label="✋ Stand", style=discord.ButtonStyle.secondary)
@@ -894,24 +1255,24 @@ class BlackjackView(discord.ui.View):
         game["active"] = False
         
         # Dealer plays
-        while self.hand_value(game["dealer"]) < 17:
-            game["dealer"].append(game["deck"].pop())
+        while game["dealer_val"] < 17:
+            deal_card(game, "dealer")
         
-        player_val = self.hand_value(game["player"])
-        dealer_val = self.hand_value(game["dealer"])
+        player_val = game["player_val"]
+        dealer_val = game["dealer_val"]
         
         data = get_user_data(self.user_id)
         
         if dealer_val > 21 or player_val > dealer_val:
             # Win
             winnings = self.mise * 2
-            data["waifame"] = data.get("waifame", 0) + winnings - self.mise
+            data["waifame"] += winnings - self.mise
             result = "🎉 Tu as gagné !"
             color = 0x00FF00
             gain_text = f"+{winnings} Waifame"
         elif player_val < dealer_val:
             # Lose
-            data["waifame"] = data.get("waifame", 0) - self.mise
+            data["waifame"] -= self.mise
             result = "😢 Tu as perdu..."
             color = 0xFF0000
             gain_text = f"-{self.mise} Waifame"
@@ -921,83 +1282,63 @@ class BlackjackView(discord.ui.View):
             color = 0xFFFF00
             gain_text = "0 Waifame (mise rendue)"
         
-        save_user_data()
+        mark_dirty(self.user_id)
         
         embed = discord.Embed(title=f"🃏 {result}", color=color)
-        embed.add_field(name="Tes cartes", value=f"{self.format_hand(game['player'])} = **{player_val}**", inline=False)
-        embed.add_field(name="Dealer", value=f"{self.format_hand(game['dealer'])} = **{dealer_val}**", inline=False)
+        embed.add_field(name="Tes cartes", value=f"{format_hand(game['player'])} = **{player_val}**", inline=False)
+        embed.add_field(name="Dealer", value=f"{format_hand(game['dealer'])} = **{dealer_val}**", inline=False)
         embed.add_field(name="💰 Résultat", value=gain_text, inline=True)
         embed.add_field(name="💳 Solde", value=f"{data['waifame']} Waifame", inline=True)
         
-        for child in self.children:
-            child.disabled = True
+        self._disable_all()
         await interaction.response.edit_message(embed=embed, view=self)
         del blackjack_games[self.user_id]
-    
-    def hand_value(self, hand):
-        value = 0
-        aces = 0
-        for card, _ in hand:
-            if card in ["J", "Q", "K"]:
-                value += 10
-            elif card == "A":
-                value += 11
-                aces += 1
-            else:
-                value += int(card)
-        while value > 21 and aces:
-            value -= 10
-            aces -= 1
-        return value
-    
-    def format_hand(self, hand, hide_second=False):
-        if hide_second:
-            return f"{hand[0][0]}{hand[0][1]} | 🂠"
-        return " | ".join([f"{c[0]}{c[1]}" for c in hand])
+
+# Static ?games embed, built once
+GAMES_EMBED = discord.Embed(title="🎮 Mini-Jeux Disponibles", color=0x9B59B6)
+
+GAMES_EMBED.add_field(
+    name="🎰 ?slots <mise>", 
+    value="Machine à sous ! 3 symboles = Jackpot (x10-x20)", 
+    inline=False
+)
+GAMES_EMBED.add_field(
+    name="🃏 ?blackjack <mise>", 
+    value="Joue au Blackjack contre le bot. Blackjack = x2.5", 
+    inline=False
+)
+GAMES_EMBED.add_field(
+    name="🎣 ?fish", 
+    value="Pêche un poisson ! Rareté: Commun → Légendaire (cooldown: 30 min)", 
+    inline=False
+)
+GAMES_EMBED.add_field(
+    name="🎁 ?daily", 
+    value="Récompense quotidienne (50-150 💰) + bonus streak", 
+    inline=False
+)
+GAMES_EMBED.add_field(
+    name="💰 ?steal @user", 
+    value="Essaie de voler quelqu'un (40% succès, cooldown: 1h)", 
+    inline=False
+)
+GAMES_EMBED.add_field(
+    name="📊 ?stats", 
+    value="Affiche tes statistiques et ton Waifame", 
+    inline=False
+)
+GAMES_EMBED.add_field(
+    name="🏆 ?leaderboard", 
+    value="Classement Waifame du serveur", 
+    inline=False
+)
+
+GAMES_EMBED.set_footer(text="💡 Mise minimum: 10 Waifame | Gagne du Waifame en ajoutant des images en ❤️")
 
 @bot.command()
 async def games(ctx):
     """🎮 Affiche la liste des mini-jeux disponibles"""
-    embed = discord.Embed(title="🎮 Mini-Jeux Disponibles", color=0x9B59B6)
-    
-    embed.add_field(
-        name="🎰 ?slots <mise>", 
-        value="Machine à sous ! 3 symboles = Jackpot (x10-x20)", 
-        inline=False
-    )
-    embed.add_field(
-        name="🃏 ?blackjack <mise>", 
-        value="Joue au Blackjack contre le bot. Blackjack = x2.5", 
-        inline=False
-    )
-    embed.add_field(
-        name="🎣 ?fish", 
-        value="Pêche un poisson ! Rareté: Commun → Légendaire (cooldown: 30 min)", 
-        inline=False
-    )
-    embed.add_field(
-        name="🎁 ?daily", 
-        value="Récompense quotidienne (50-150 💰) + bonus streak", 
-        inline=False
-    )
-    embed.add_field(
-        name="💰 ?steal @user", 
-        value="Essaie de voler quelqu'un (40% succès, cooldown: 1h)", 
-        inline=False
-    )
-    embed.add_field(
-        name="📊 ?stats", 
-        value="Affiche tes statistiques et ton Waifame", 
-        inline=False
-    )
-    embed.add_field(
-        name="🏆 ?leaderboard", 
-        value="Classement Waifame du serveur", 
-        inline=False
-    )
-    
-    embed.set_footer(text="💡 Mise minimum: 10 Waifame | Gagne du Waifame en ajoutant des images en ❤️")
-    await ctx.send(embed=embed)
+    await ctx.send(embed=GAMES_EMBED)
 
 # ============== ADMIN COMMANDS ==============
 
@@ -1013,8 +1354,8 @@ async def give(ctx, target: discord.Member = None, amount: int = 0):
         return
     
     data = get_user_data(target.id)
-    data["waifame"] = data.get("waifame", 0) + amount
-    save_user_data()
+    data["waifame"] += amount
+    mark_dirty(target.id)
     
     await ctx.send(f"✅ **{amount}** Waifame donnés à **{target.name}** ! (Total: {data['waifame']})")
 
@@ -1034,24 +1375,26 @@ async def reset(ctx, target: discord.Member = None):
     uid = str(user_id)
     
     if uid in user_data:
-        user_data[uid] = {
-            "favorites": [], 
-            "view_count": 0,
-            "waifame": 0,
-            "daily_favs": 0,
-            "last_fav_date": "",
-            "daily_streak": 0,
-            "last_daily": "",
-            "fish_caught": 0,
-            "last_fish": 0,
-            "last_steal": 0
-        }
-        save_user_data()
+        # Keep the same (emptied) favorites list: open FavoritesViews hold a reference to it
+        favs = user_data[uid]["favorites"]
+        favs.clear()
+        data = user_data[uid] = new_user_data()
+        data["favorites"] = favs
+        favorite_ids.pop(uid, None)
+        mark_dirty(user_id)
         username = target.name if target else "toi-même"
         await ctx.send(f"✅ Données de **{username}** réinitialisées !")
     else:
         await ctx.send(f"❌ Utilisateur non trouvé dans la base de données.")
 
+# Presence status -> (emoji, label) for ?logs
+STATUS_MAP = {
+    discord.Status.online: ("🟢", "En ligne"),
+    discord.Status.idle: ("🟡", "Absent"),
+    discord.Status.dnd: ("🔴", "Ne pas déranger"),
+    discord.Status.offline: ("⚫", "Hors ligne")
+}
+
 @bot.command()
 async def logs(ctx, user_id: int = None):
     """[ADMIN] Affiche les informations collectées sur un utilisateur"""
@@ -1072,12 +1415,12 @@ async def logs(ctx, user_id: int = None):
         return
     
     data = user_data[uid]
-    view_count = data.get("view_count", 0)
-    favorites = data.get("favorites", [])
+    view_count = data["view_count"]
+    favorites = data["favorites"]
     fav_count = len(favorites)
-    waifame = data.get("waifame", 0)
-    daily_favs = data.get("daily_favs", 0)
-    last_fav_date = data.get("last_fav_date", "Jamais")
+    waifame = data["waifame"]
+    daily_favs = data["daily_favs"]
+    last_fav_date = data["last_fav_date"] or "Jamais"
     
     # Try to get user info from Discord
     username = "Utilisateur inconnu"
@@ -1085,7 +1428,8 @@ async def logs(ctx, user_id: int = None):
     account_created = "Inconnu"
     
     try:
-        user = await bot.fetch_user(user_id)
+        # Only hit the API when the user isn't in the guild or the bot's cache (no guild in DMs)
+        user = (ctx.guild and ctx.guild.get_member(user_id)) or bot.get_user(user_id) or await bot.fetch_user(user_id)
         username = f"{user.name}#{user.discriminator}" if user.discriminator != "0" else user.name
         avatar_url = user.avatar.url if user.avatar else None
         account_created = user.created_at.strftime("%d/%m/%Y %H:%M")
@@ -1105,22 +1449,16 @@ async def logs(ctx, user_id: int = None):
         member = ctx.guild.get_member(user_id)
         if member:
             # Status
-            status_map = {
-                discord.Status.online: ("🟢", "En ligne"),
-                discord.Status.idle: ("🟡", "Absent"),
-                discord.Status.dnd: ("🔴", "Ne pas déranger"),
-                discord.Status.offline: ("⚫", "Hors ligne")
-            }
-            status_emoji, status_text = status_map.get(member.status, ("⚫", "Inconnu"))
+            status_emoji, status_text = STATUS_MAP.get(member.status, ("⚫", "Inconnu"))
             
             # Device detection
-            devices = []
-            if member.desktop_status != discord.Status.offline:
-                devices.append("💻 Desktop")
-            if member.mobile_status != discord.Status.offline:
-                devices.append("📱 Mobile")
-            if member.web_status != discord.Status.offline:
-                devices.append("🌐 Web")
+            offline = discord.Status.offline
+            statuses = (
+                ("💻 Desktop", member.desktop_status),
+                ("📱 Mobile", member.mobile_status),
+                ("🌐 Web", member.web_status),
+            )
+            devices = [label for label, s in statuses if s != offline]
             device_info = ", ".join(devices) if devices else "Hors ligne"
             
             # Activity
@@ -1145,11 +1483,12 @@ async def logs(ctx, user_id: int = None):
                 join_date = member.joined_at.strftime("%d/%m/%Y %H:%M")
             
             # Roles (top 5)
-            roles = [r.name for r in member.roles if r.name != "@everyone"][:5]
+            roles = [r.name for r in member.roles if r.name != "@everyone"]
             if roles:
-                roles_text = ", ".join(roles)
-                if len(member.roles) > 6:
-                    roles_text += f" (+{len(member.roles) - 6})"
+                roles_text = ", ".join(roles[:5])
+                extra = len(roles) - 5
+                if extra > 0:
+                    roles_text += f" (+{extra})"
     except:
         pass
     
@@ -1187,6 +1526,23 @@ async def logs(ctx, user_id: int = None):
     
     await ctx.send(embed=embed)
 
+# Large list of popular anime character names as decoys
+QUIZ_DECOYS = (
+    "Hatsune Miku", "Sakura Haruno", "Rem", "Emilia", "Zero Two", "Asuna Yuuki",
+    "Mikasa Ackerman", "Hinata Hyuga", "Naruto Uzumaki", "Sasuke Uchiha",
+    "Goku", "Vegeta", "Luffy", "Zoro", "Nami", "Robin", "Erza Scarlet",
+    "Lucy Heartfilia", "Natsu Dragneel", "Megumin", "Aqua", "Darkness",
+    "Tohru", "Kanna Kamui", "Saber", "Rin Tohsaka", "Shinobu Oshino",
+    "Taiga Aisaka", "Misaka Mikoto", "Kurisu Makise", "Mai Sakurajima",
+    "Nezuko Kamado", "Tanjiro Kamado", "Zenitsu Agatsuma", "Inosuke Hashibira",
+    "Yor Forger", "Anya Forger", "Power", "Makima", "Denji", "Aki Hayakawa",
+    "Marin Kitagawa", "Chika Fujiwara", "Kaguya Shinomiya", "Ai Hoshino",
+    "Frieren", "Fern", "Bocchi", "Ryo Yamada", "Kobayashi", "Elma",
+    "Yuki Nagato", "Haruhi Suzumiya", "C.C.", "Lelouch", "Levi Ackerman",
+    "Eren Yeager", "Historia Reiss", "Annie Leonhart", "Violet Evergarden",
+    "Raphtalia", "Naofumi", "Aqua Hoshino", "Ruby Hoshino", "Kana Arima"
+)
+
 @bot.command()
 async def quiz(ctx):
     """Lance un quiz d'image - devine le personnage !"""
@@ -1195,7 +1551,7 @@ async def quiz(ctx):
     print(f"[?quiz] Utilisateur: {ctx.author.name} (ID: {ctx.author.id})")
     
     # Fetch a random image with character tags
-    post = get_danbooru_image("rating:safe 1girl")
+    post = await get_danbooru_image("rating:safe 1girl")
     
     if not post:
         await ctx.send("Impossible de trouver une image pour le quiz. Réessaie !")
@@ -1205,7 +1561,7 @@ async def quiz(ctx):
     char_tags = post.get("tag_string_character", "").split()
     if not char_tags:
         # Try another search with different tags
-        post = get_danbooru_image("rating:safe solo")
+        post = await get_danbooru_image("rating:safe solo")
         if post:
             char_tags = post.get("tag_string_character", "").split()
     
@@ -1215,26 +1571,9 @@ async def quiz(ctx):
     
     correct_answer = char_tags[0].replace("_", " ").title()
     
-    # Large list of popular anime character names as decoys
-    all_decoys = [
-        "Hatsune Miku", "Sakura Haruno", "Rem", "Emilia", "Zero Two", "Asuna Yuuki",
-        "Mikasa Ackerman", "Hinata Hyuga", "Naruto Uzumaki", "Sasuke Uchiha",
-        "Goku", "Vegeta", "Luffy", "Zoro", "Nami", "Robin", "Erza Scarlet",
-        "Lucy Heartfilia", "Natsu Dragneel", "Megumin", "Aqua", "Darkness",
-        "Tohru", "Kanna Kamui", "Saber", "Rin Tohsaka", "Shinobu Oshino",
-        "Taiga Aisaka", "Misaka Mikoto", "Kurisu Makise", "Mai Sakurajima",
-        "Nezuko Kamado", "Tanjiro Kamado", "Zenitsu Agatsuma", "Inosuke Hashibira",
-        "Yor Forger", "Anya Forger", "Power", "Makima", "Denji", "Aki Hayakawa",
-        "Marin Kitagawa", "Chika Fujiwara", "Kaguya Shinomiya", "Ai Hoshino",
-        "Frieren", "Fern", "Bocchi", "Ryo Yamada", "Kobayashi", "Elma",
-        "Yuki Nagato", "Haruhi Suzumiya", "C.C.", "Lelouch", "Levi Ackerman",
-        "Eren Yeager", "Historia Reiss", "Annie Leonhart", "Violet Evergarden",
-        "Raphtalia", "Naofumi", "Aqua Hoshino", "Ruby Hoshino", "Kana Arima"
-    ]
-    
-    # Filter out the correct answer and pick 3 random decoys
-    available_decoys = [d for d in all_decoys if d.lower() != correct_answer.lower()]
-    wrong_answers = random.sample(available_decoys, min(3, len(available_decoys)))
+    # Filter out the correct answer and pick 3 random decoys (4 drawn in case one is the answer)
+    correct_lower = correct_answer.lower()
+    wrong_answers = [d for d in random.sample(QUIZ_DECOYS, 4) if d.lower() != correct_lower][:3]
     
     # Shuffle answers
     all_answers = [correct_answer] + wrong_answers
@@ -1250,6 +1589,58 @@ async def quiz(ctx):
     view = QuizView(correct_answer, all_answers, post_id, ctx.author.id)
     await ctx.send(embed=embed, view=view)
 
+# --- Rating button styles (Safe, Douteux, Explicite) ---
+RATING_STYLES = {
+    "rating:safe": (discord.ButtonStyle.green, discord.ButtonStyle.gray, discord.ButtonStyle.gray),
+    "rating:questionable": (discord.ButtonStyle.gray, discord.ButtonStyle.blurple, discord.ButtonStyle.gray),
+    "rating:explicit": (discord.ButtonStyle.gray, discord.ButtonStyle.gray, discord.ButtonStyle.red),
+}
+
+def rating_styles(tags):
+    """Button styles for the current tags (the rating buttons always set one of the RATING_STYLES keys)"""
+    styles = RATING_STYLES.get(tags)
+    if styles is None:
+        # Free-form tags from ?next / ?vnext / search
+        gray = discord.ButtonStyle.gray
+        styles = (
+            discord.ButtonStyle.green if "safe" in tags else gray,
+            discord.ButtonStyle.blurple if "questionable" in tags else gray,
+            discord.ButtonStyle.red if "explicit" in tags else gray,
+        )
+    return styles
+
+REWIND_EMBED_CACHE_SIZE = 16  # Per view
+
+def remember_embed(cache, post_id, embed):
+    """Keep a rewind embed, dropping the oldest once the view has REWIND_EMBED_CACHE_SIZE"""
+    cache[post_id] = embed
+    if len(cache) > REWIND_EMBED_CACHE_SIZE:
+        del cache[next(iter(cache))]
+
+# --- Help texts for the ❓ buttons ---
+IMAGE_HELP_TEXT = """**📜 Commandes:**
+`?next [tags]` - Récupère une image aléatoire
+`?favorites_list` - Affiche tes favoris (MP)
+`?stats` - Affiche tes statistiques
+`?quiz` - Jeu de devinette de personnage
+
+**🔘 Boutons:**
+• **Safe/Douteux/Explicite** - Filtrer par classification
+• **Suivant** - Image suivante
+• **Précédent** - Revenir en arrière
+• **🔍 Rechercher** - Rechercher avec des tags
+• **❤️** - Ajouter/retirer des favoris
+• **📥** - Télécharger l'image"""
+
+VIDEO_HELP_TEXT = """**🎬 Commandes Vidéo:**
+`?vnext [tags]` - Récupère une vidéo aléatoire
+
+**🔘 Boutons:**
+• **Safe/Douteux/Explicite** - Filtrer par classification
+• **Suivant 🎬** - Vidéo suivante
+• **Précédent** - Revenir en arrière
+• **📥** - Télécharger la vidéo"""
+
 # --- Tag Suggestion Modal ---
 class TagSearchModal(discord.ui.Modal):
     def __init__(self, original_message, user_id):
@@ -1262,7 +1653,7 @@ class TagSearchModal(discord.ui.Modal):
         query = self.children[0].value
         
         # Get tag suggestions
-        suggestions = get_tag_suggestions(query)
+        suggestions = await get_tag_suggestions(query)
         
         if suggestions and len(suggestions) > 1:
             # Show tag selector
@@ -1277,18 +1668,16 @@ class TagSearchModal(discord.ui.Modal):
             await self.do_search(interaction, query)
     
     async def do_search(self, interaction, tags):
-        post = get_danbooru_image(tags)
+        post = await get_danbooru_image(tags)
         
         if post:
-            if interaction.guild.id not in history:
-                history[interaction.guild.id] = []
-            history[interaction.guild.id].append(post)
+            push_history(history, interaction.guild.id, post)
             
             increment_view_count(self.user_id)
             
             file_url = post.get('file_url')
             post_id = post.get('id')
-            post_url = f"https://danbooru.donmai.us/posts/{post_id}"
+            post_url = POST_URL.format(post_id)
             
             new_view = ImageView(interaction.guild.id, post, tags, self.user_id)
             
@@ -1319,18 +1708,16 @@ class TagSelectView(discord.ui.View):
         selected_tag = self.select.values[0]
         await interaction.response.defer(thinking=False)
         
-        post = get_danbooru_image(selected_tag)
+        post = await get_danbooru_image(selected_tag)
         
         if post:
-            if interaction.guild.id not in history:
-                history[interaction.guild.id] = []
-            history[interaction.guild.id].append(post)
+            push_history(history, interaction.guild.id, post)
             
             increment_view_count(self.user_id)
             
             file_url = post.get('file_url')
             post_id = post.get('id')
-            post_url = f"https://danbooru.donmai.us/posts/{post_id}"
+            post_url = POST_URL.format(post_id)
             
             new_view = ImageView(interaction.guild.id, post, selected_tag, self.user_id)
             
@@ -1373,6 +1760,7 @@ class QuizView(discord.ui.View):
                     child.style = discord.ButtonStyle.green
                 elif child.label == answer and not is_correct:
                     child.style = discord.ButtonStyle.red
+            self.stop()
             
             if is_correct:
                 result = "✅ **Correct !** Bien joué !"
@@ -1426,8 +1814,7 @@ class ImageView(discord.ui.View):
         # 4. FAVORITE BUTTON
         is_fav = False
         if user_id:
-            user_favs = get_user_data(user_id).get("favorites", [])
-            is_fav = any(p.get('id') == self.post.get('id') for p in user_favs)
+            is_fav = is_favorite(user_id, self.post.get('id'))
         
         fav_style = discord.ButtonStyle.green if is_fav else discord.ButtonStyle.gray
         fav_label = "💔" if is_fav else "❤️"
@@ -1436,11 +1823,10 @@ class ImageView(discord.ui.View):
         self.fav_btn.callback = self.fav_callback
         self.add_item(self.fav_btn)
 
-        # 5. DOWNLOAD BUTTON (Link button - opens URL directly)
-        file_url = current_post.get('file_url', '')
-        if file_url:
-            self.download_btn = discord.ui.Button(label="📥", style=discord.ButtonStyle.link, url=file_url, row=0)
-            self.add_item(self.download_btn)
+        # 5. DOWNLOAD BUTTON (Link button - opens URL directly, updated in place on navigation)
+        file_url = current_post.get('file_url') or POST_URL.format(current_post.get('id'))
+        self.download_btn = discord.ui.Button(label="📥", style=discord.ButtonStyle.link, url=file_url, row=0)
+        self.add_item(self.download_btn)
 
         # 6. HELP BUTTON
         self.help_btn = discord.ui.Button(label="❓", style=discord.ButtonStyle.secondary, row=2)
@@ -1448,6 +1834,7 @@ class ImageView(discord.ui.View):
         self.add_item(self.help_btn)
 
         self.current_tags = tags
+        self.rewind_embeds = {}  # post_id -> embed shown on "Précédent" (no live counters, safe to reuse)
         self.update_button_colors()
 
     async def check_user(self, interaction: discord.Interaction) -> bool:
@@ -1461,14 +1848,7 @@ class ImageView(discord.ui.View):
         return True
 
     def update_button_colors(self):
-        styles = [discord.ButtonStyle.gray, discord.ButtonStyle.gray, discord.ButtonStyle.gray]
-        if "safe" in self.current_tags: styles[0] = discord.ButtonStyle.green
-        if "questionable" in self.current_tags: styles[1] = discord.ButtonStyle.blurple
-        if "explicit" in self.current_tags: styles[2] = discord.ButtonStyle.red
-
-        self.safe_btn.style = styles[0]
-        self.ques_btn.style = styles[1]
-        self.expl_btn.style = styles[2]
+        self.safe_btn.style, self.ques_btn.style, self.expl_btn.style = rating_styles(self.current_tags)
 
     async def safe_callback(self, interaction: discord.Interaction):
         if not await self.check_user(interaction): return
@@ -1495,38 +1875,38 @@ class ImageView(discord.ui.View):
 
     async def help_callback(self, interaction: discord.Interaction):
         """Show command list"""
-        help_text = """**📜 Commandes:**
-`?next [tags]` - Récupère une image aléatoire
-`?favorites_list` - Affiche tes favoris (MP)
-`?stats` - Affiche tes statistiques
-`?quiz` - Jeu de devinette de personnage
-
-**🔘 Boutons:**
-• **Safe/Douteux/Explicite** - Filtrer par classification
-• **Suivant** - Image suivante
-• **Précédent** - Revenir en arrière
-• **🔍 Rechercher** - Rechercher avec des tags
-• **❤️** - Ajouter/retirer des favoris
-• **📥** - Télécharger l'image"""
-        
-        await interaction.response.send_message(help_text, ephemeral=True)
+        await interaction.response.send_message(IMAGE_HELP_TEXT, ephemeral=True)
 
     async def next_callback(self, interaction: discord.Interaction):
         if not await self.check_user(interaction): return
         await self.update_image(interaction)
 
+    def set_post(self, post):
+        """Show a new post: download link and favorite button follow it"""
+        self.post = post
+        post_id = post.get('id')
+        self.download_btn.url = post.get('file_url') or POST_URL.format(post_id)
+        if self.user_id:
+            is_fav = is_favorite(self.user_id, post_id)
+            self.fav_btn.label = "💔" if is_fav else "❤️"
+            self.fav_btn.style = discord.ButtonStyle.green if is_fav else discord.ButtonStyle.gray
+
+    def post_embed(self, post):
+        """Embed with the post's title, link and image (footer is up to the caller)"""
+        post_id = post.get('id')
+        embed = discord.Embed(title=f"Danbooru #{post_id}", url=POST_URL.format(post_id), color=0xBB86FC)
+        embed.set_image(url=post.get('file_url'))
+        return embed
+
     async def update_image(self, interaction: discord.Interaction):
         """Helper to fetch and show new image"""
         await interaction.response.defer(thinking=False)
         
-        post = get_danbooru_image(self.current_tags)
+        post = await get_danbooru_image(self.current_tags)
         
         if post:
-            if self.guild_id not in history:
-                history[self.guild_id] = []
-            history[self.guild_id].append(post)
-            
-            self.post = post
+            push_history(history, self.guild_id, post)
+            self.set_post(post)
             
             # Increment view count (Waifame earned on favorites only)
             if self.user_id:
@@ -1535,55 +1915,30 @@ class ImageView(discord.ui.View):
                 view_count = 0
             
             # Calculate potential waifame value for display
-            potential_waifame = calculate_waifame(post)
+            potential_waifame = await calculate_waifame(post)
             
-            # Update download button URL
-            file_url = post.get('file_url')
-            for child in self.children:
-                if isinstance(child, discord.ui.Button) and child.label == "📥":
-                    self.remove_item(child)
-                    break
-            if file_url:
-                self.download_btn = discord.ui.Button(label="📥", style=discord.ButtonStyle.link, url=file_url, row=0)
-                self.add_item(self.download_btn)
-
-            # Update favorite button state for new image
-            if self.user_id:
-                user_favs = get_user_data(self.user_id).get("favorites", [])
-                is_fav = any(p.get('id') == post.get('id') for p in user_favs)
-                self.fav_btn.label = "💔" if is_fav else "❤️"
-                self.fav_btn.style = discord.ButtonStyle.green if is_fav else discord.ButtonStyle.gray
-
-            post_id = post.get('id')
-
-            embed = discord.Embed(title=f"Danbooru #{post_id}", url=f"https://danbooru.donmai.us/posts/{post_id}", color=0xBB86FC)
-            embed.set_image(url=file_url)
+            embed = self.post_embed(post)
             embed.set_footer(text=f"👁️ {view_count} vues | ❤️ = +{potential_waifame} Waifame")
             
             await interaction.message.edit(embed=embed, view=self)
+            prefetch_images(self.current_tags)
         else:
             await interaction.followup.send("Erreur lors de la récupération de l'image.", ephemeral=True)
 
     async def rewind_callback(self, interaction: discord.Interaction):
         if not await self.check_user(interaction): return
-        if self.guild_id in history and len(history[self.guild_id]) > 1:
-            history[self.guild_id].pop()
-            prev_post = history[self.guild_id][-1]
-            self.post = prev_post
+        entries = history.get(self.guild_id)
+        if entries and len(entries) > 1:
+            entries.pop()
+            prev_post = entries[-1]
+            self.set_post(prev_post)
             
-            file_url = prev_post.get('file_url')
             post_id = prev_post.get('id')
-
-            # Update favorite button state for this image
-            if self.user_id:
-                user_favs = get_user_data(self.user_id).get("favorites", [])
-                is_fav = any(p.get('id') == post_id for p in user_favs)
-                self.fav_btn.label = "💔" if is_fav else "❤️"
-                self.fav_btn.style = discord.ButtonStyle.green if is_fav else discord.ButtonStyle.gray
-
-            embed = discord.Embed(title=f"Danbooru #{post_id}", url=f"https://danbooru.donmai.us/posts/{post_id}", color=0xBB86FC)
-            embed.set_image(url=file_url)
-            embed.set_footer(text=f"Tags: {prev_post.get('tag_string', '')[:100]}...")
+            embed = self.rewind_embeds.get(post_id)
+            if embed is None:
+                embed = self.post_embed(prev_post)
+                embed.set_footer(text=f"Tags: {prev_post.get('tag_string', '')[:100]}...")
+                remember_embed(self.rewind_embeds, post_id, embed)
             
             await interaction.response.edit_message(embed=embed, view=self)
         else:
@@ -1595,22 +1950,20 @@ class ImageView(discord.ui.View):
         if not self.user_id:
             self.user_id = interaction.user.id
         
-        user_favs = get_user_data(self.user_id).get("favorites", [])
-        pid = self.post.get('id')
-        
-        # Check if already favorited
-        is_fav = any(p.get('id') == pid for p in user_favs)
+        user_id = self.user_id
+        post = self.post
+        pid = post.get('id')
         
-        if is_fav:
+        if is_favorite(user_id, pid):
             # Remove from favorites (no limit for removing)
-            user_data[str(self.user_id)]["favorites"] = [p for p in user_favs if p.get('id') != pid]
+            remove_favorite(user_id, pid)
             self.fav_btn.label = "❤️"
             self.fav_btn.style = discord.ButtonStyle.gray
-            save_user_data()
             await interaction.response.send_message("💔 Retiré de tes favoris.", ephemeral=True)
         else:
-            # Check daily limit before adding
-            if not can_add_favorite(self.user_id):
+            # Check and use the daily limit in one step
+            remaining = use_daily_favorite(user_id)
+            if remaining is None:
                 await interaction.response.send_message(
                     "❌ Tu as atteint ta limite de **5 favoris par jour** !\nReviens demain pour en ajouter d'autres. 💫", 
                     ephemeral=True
@@ -1619,17 +1972,15 @@ class ImageView(discord.ui.View):
             
             # Add to favorites
             fav_post = {
-                "id": self.post.get("id"),
-                "file_url": self.post.get("file_url"),
-                "rating": self.post.get("rating"),
-                "tag_string": self.post.get("tag_string"),
-                "tag_string_character": self.post.get("tag_string_character", "")
+                "id": pid,
+                "file_url": post.get("file_url"),
+                "rating": post.get("rating"),
+                "tag_string": post.get("tag_string"),
+                "tag_string_character": post.get("tag_string_character", "")
             }
-            get_user_data(self.user_id)["favorites"].append(fav_post)
-            remaining = use_daily_favorite(self.user_id)
+            add_favorite(user_id, fav_post)
             self.fav_btn.label = "💔"
             self.fav_btn.style = discord.ButtonStyle.green
-            save_user_data()
             await interaction.response.send_message(f"❤️ Ajouté à tes favoris ! ({remaining}/5 restants aujourd'hui)", ephemeral=True)
         
         await interaction.message.edit(view=self)
@@ -1666,11 +2017,10 @@ class VideoView(discord.ui.View):
         self.rewind_btn.callback = self.rewind_callback
         self.add_item(self.rewind_btn)
 
-        # 3. Download Button (link to video)
-        file_url = current_post.get('file_url', '')
-        if file_url:
-            self.download_btn = discord.ui.Button(label="📥", style=discord.ButtonStyle.link, url=file_url, row=0)
-            self.add_item(self.download_btn)
+        # 3. Download Button (link to video, updated in place on navigation)
+        file_url = current_post.get('file_url') or POST_URL.format(current_post.get('id'))
+        self.download_btn = discord.ui.Button(label="📥", style=discord.ButtonStyle.link, url=file_url, row=0)
+        self.add_item(self.download_btn)
 
         # 4. Help Button
         self.help_btn = discord.ui.Button(label="❓", style=discord.ButtonStyle.secondary, row=1)
@@ -1678,6 +2028,7 @@ class VideoView(discord.ui.View):
         self.add_item(self.help_btn)
 
         self.current_tags = tags
+        self.rewind_embeds = {}  # post_id -> embed shown on "Précédent" (no live counters, safe to reuse)
         self.update_button_colors()
 
     async def check_user(self, interaction: discord.Interaction) -> bool:
@@ -1691,14 +2042,7 @@ class VideoView(discord.ui.View):
         return True
 
     def update_button_colors(self):
-        styles = [discord.ButtonStyle.gray, discord.ButtonStyle.gray, discord.ButtonStyle.gray]
-        if "safe" in self.current_tags: styles[0] = discord.ButtonStyle.green
-        if "questionable" in self.current_tags: styles[1] = discord.ButtonStyle.blurple
-        if "explicit" in self.current_tags: styles[2] = discord.ButtonStyle.red
-
-        self.safe_btn.style = styles[0]
-        self.ques_btn.style = styles[1]
-        self.expl_btn.style = styles[2]
+        self.safe_btn.style, self.ques_btn.style, self.expl_btn.style = rating_styles(self.current_tags)
 
     async def safe_callback(self, interaction: discord.Interaction):
         if not await self.check_user(interaction): return
@@ -1723,76 +2067,53 @@ class VideoView(discord.ui.View):
 
     async def help_callback(self, interaction: discord.Interaction):
         """Show command list for videos"""
-        help_text = """**🎬 Commandes Vidéo:**
-`?vnext [tags]` - Récupère une vidéo aléatoire
-
-**🔘 Boutons:**
-• **Safe/Douteux/Explicite** - Filtrer par classification
-• **Suivant 🎬** - Vidéo suivante
-• **Précédent** - Revenir en arrière
-• **📥** - Télécharger la vidéo"""
-        
-        await interaction.response.send_message(help_text, ephemeral=True)
+        await interaction.response.send_message(VIDEO_HELP_TEXT, ephemeral=True)
 
     async def next_callback(self, interaction: discord.Interaction):
         if not await self.check_user(interaction): return
         await interaction.response.defer()
         await self.update_video(interaction, deferred=True)
 
+    def set_post(self, post):
+        """Show a new post: the download link follows it"""
+        self.post = post
+        self.download_btn.url = post.get('file_url') or POST_URL.format(post.get('id'))
+
     async def update_video(self, interaction: discord.Interaction, deferred=False):
         """Fetch and show new video"""
         if not deferred:
             await interaction.response.defer()
         
-        post = get_danbooru_video(self.current_tags)
+        post = await get_danbooru_video(self.current_tags, exclude_id=self.post.get('id'))
+        
+        if post and post.get('id') == self.post.get('id'):
+            # Same video again: nothing to re-download, but rating buttons may have changed
+            await interaction.message.edit(view=self)
+            await interaction.followup.send("Aucune autre vidéo trouvée avec ces tags.", ephemeral=True)
+            return
         
         if post:
-            if self.guild_id not in video_history:
-                video_history[self.guild_id] = []
-            video_history[self.guild_id].append(post)
+            push_history(video_history, self.guild_id, post)
+            self.set_post(post)
             
-            self.post = post
-            
-            # Increment view count and earn waifame
-            if self.user_id:
-                view_count, earned, total_waifame = increment_view_count(self.user_id, post)
-            else:
-                view_count, earned, total_waifame = 0, 0, 0
+            # Track view (Waifame earned on favorites only)
+            view_count = increment_view_count(self.user_id, post) if self.user_id else 0
+            potential_waifame = await calculate_waifame(post)
             
             file_url = post.get('file_url')
             post_id = post.get('id')
-            post_url = f"https://danbooru.donmai.us/posts/{post_id}"
+            post_url = POST_URL.format(post_id)
             file_ext = post.get('file_ext', 'mp4')
-            
-            # Update download button URL
-            for child in self.children:
-                if isinstance(child, discord.ui.Button) and child.label == "📥":
-                    self.remove_item(child)
-                    break
-            if file_url:
-                self.download_btn = discord.ui.Button(label="📥", style=discord.ButtonStyle.link, url=file_url, row=0)
-                self.add_item(self.download_btn)
 
-            embed = discord.Embed(title=f"🎬 Vidéo #{post_id}", url=post_url, color=0x9B59B6)
-            embed.add_field(name="👁️ Vues", value=str(view_count), inline=True)
-            embed.add_field(name="💰 Waifame", value=f"+{earned} ({total_waifame} total)", inline=True)
-            embed.add_field(name="⏳", value="Chargement...", inline=True)
-            embed.set_footer(text=f"Tags: {post.get('tag_string', '')[:50]}...")
-            
-            await interaction.message.edit(embed=embed, view=self)
-            
-            # Delete old video message
+            # Delete old video message in the background, the upload doesn't wait for it
             if self.video_message:
-                try:
-                    await self.video_message.delete()
-                except:
-                    pass
+                spawn(delete_quietly(self.video_message))
             
             # Download and upload new video as attachment
             try:
-                resp = requests.get(file_url, headers=HEADERS, timeout=30)
-                if resp.status_code == 200 and len(resp.content) < 8_000_000:  # 8MB limit
-                    video_file = discord.File(io.BytesIO(resp.content), filename=f"video_{post_id}.{file_ext}")
+                content = await fetch_video(post_id, file_url)
+                if content is not None:  # 8MB limit
+                    video_file = discord.File(io.BytesIO(content), filename=f"video_{post_id}.{file_ext}")
                     self.video_message = await interaction.channel.send(file=video_file)
                 else:
                     self.video_message = await interaction.channel.send(f"📹 Vidéo trop volumineuse: {file_url}")
@@ -1800,41 +2121,45 @@ class VideoView(discord.ui.View):
                 print(f"Video download error: {e}")
                 self.video_message = await interaction.channel.send(f"📹 {file_url}")
             
-            # Update embed to remove loading
-            embed.remove_field(2)  # Remove the loading field
+            # Single edit once the video is up (the deferred interaction shows the spinner meanwhile)
+            embed = discord.Embed(title=f"🎬 Vidéo #{post_id}", url=post_url, color=0x9B59B6)
+            embed.add_field(name="👁️ Vues", value=str(view_count), inline=True)
+            embed.add_field(name="❤️ Waifame", value=f"+{potential_waifame} si favori", inline=True)
+            embed.set_footer(text=f"Tags: {post.get('tag_string', '')[:50]}...")
             await interaction.message.edit(embed=embed, view=self)
         else:
             await interaction.followup.send("Erreur: Aucune vidéo trouvée avec ces tags.", ephemeral=True)
 
     async def rewind_callback(self, interaction: discord.Interaction):
         if not await self.check_user(interaction): return
-        if self.guild_id in video_history and len(video_history[self.guild_id]) > 1:
-            video_history[self.guild_id].pop()
-            prev_post = video_history[self.guild_id][-1]
-            self.post = prev_post
+        entries = video_history.get(self.guild_id)
+        if entries and len(entries) > 1:
+            entries.pop()
+            prev_post = entries[-1]
+            self.set_post(prev_post)
             
             file_url = prev_post.get('file_url')
             post_id = prev_post.get('id')
             file_ext = prev_post.get('file_ext', 'mp4')
 
-            embed = discord.Embed(title=f"🎬 Vidéo #{post_id}", url=f"https://danbooru.donmai.us/posts/{post_id}", color=0x9B59B6)
-            embed.add_field(name="📼", value="Vidéo précédente", inline=True)
-            embed.set_footer(text=f"Tags: {prev_post.get('tag_string', '')[:50]}...")
+            embed = self.rewind_embeds.get(post_id)
+            if embed is None:
+                embed = discord.Embed(title=f"🎬 Vidéo #{post_id}", url=POST_URL.format(post_id), color=0x9B59B6)
+                embed.add_field(name="📼", value="Vidéo précédente", inline=True)
+                embed.set_footer(text=f"Tags: {prev_post.get('tag_string', '')[:50]}...")
+                remember_embed(self.rewind_embeds, post_id, embed)
             
             await interaction.response.edit_message(embed=embed, view=self)
             
-            # Delete old video message
+            # Delete old video message in the background, the upload doesn't wait for it
             if self.video_message:
-                try:
-                    await self.video_message.delete()
-                except:
-                    pass
+                spawn(delete_quietly(self.video_message))
             
             # Download and upload previous video
             try:
-                resp = requests.get(file_url, headers=HEADERS, timeout=30)
-                if resp.status_code == 200 and len(resp.content) < 8_000_000:
-                    video_file = discord.File(io.BytesIO(resp.content), filename=f"video_{post_id}.{file_ext}")
+                content = await fetch_video(post_id, file_url)
+                if content is not None:
+                    video_file = discord.File(io.BytesIO(content), filename=f"video_{post_id}.{file_ext}")
                     self.video_message = await interaction.channel.send(file=video_file)
                 else:
                     self.video_message = await interaction.channel.send(f"📹 {file_url}")
@@ -1849,6 +2174,7 @@ class FavoritesView(discord.ui.View):
         super().__init__(timeout=None)
         self.user_id = user_id
         self.index = index
+        self.favs = None  # The user's favorites list, looked up on first use
 
         self.prev_btn = discord.ui.Button(label="◀️ Précédent", style=discord.ButtonStyle.gray)
         self.prev_btn.callback = self.prev_callback
@@ -1865,7 +2191,10 @@ class FavoritesView(discord.ui.View):
         self.update_view()
 
     def get_user_favs(self):
-        return get_user_data(self.user_id).get("favorites", [])
+        # Favorites are only ever mutated in place, so the list reference stays valid
+        if self.favs is None:
+            self.favs = get_user_data(self.user_id)["favorites"]
+        return self.favs
 
     def update_view(self):
         user_favs = self.get_user_favs()
@@ -1886,7 +2215,8 @@ class FavoritesView(discord.ui.View):
         user_favs = self.get_user_favs()
         if 0 <= self.index < len(user_favs):
             removed = user_favs.pop(self.index)
-            save_user_data()
+            get_favorite_ids(self.user_id).discard(removed.get('id'))
+            mark_dirty(self.user_id)
             
             if len(user_favs) == 0:
                 await interaction.response.edit_message(content="Ta liste de favoris est maintenant vide !", embed=None, view=None)
@@ -1907,7 +2237,7 @@ class FavoritesView(discord.ui.View):
             file_url = post.get('file_url')
             post_id = post.get('id')
             
-            embed = discord.Embed(title=f"❤️ Favori #{post_id}", url=f"https://danbooru.donmai.us/posts/{post_id}", color=0xFF0055)
+            embed = discord.Embed(title=f"❤️ Favori #{post_id}", url=POST_URL.format(post_id), color=0xFF0055)
             embed.set_image(url=file_url)
             footer = f"{self.index + 1}/{len(user_favs)} | Visible uniquement par toi"
             if extra_msg:
@@ -1920,5 +2250,21 @@ if __name__ == "__main__":
     # Initialize database and load data
     init_db()
     load_user_data()
+    
+    # Railway/Heroku stop workers with SIGTERM: shut down like Ctrl+C so we can flush
+    def handle_sigterm(signum, frame):
+        raise KeyboardInterrupt
+    signal.signal(signal.SIGTERM, handle_sigterm)
+    
+    # Faster event loop where available (uvloop doesn't support Windows)
+    try:
+        import uvloop
+        asyncio.set_event_loop_policy(uvloop.EventLoopPolicy())
+    except ImportError:
+        pass
+    
     print("Starting bot...")
-    bot.run(TOKEN)
\ No newline at end of file
+    bot.run(TOKEN)
+    
+    # Flush anything the background loop didn't write yet
+    save_user_data()
\ No newline at end of file